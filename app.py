@@ -1,31 +1,84 @@
+import http.cookiejar
 import json
 import os
 import re
 import requests
 import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
 from functools import wraps
-from flask import Flask, jsonify, redirect, render_template, request, url_for, session
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from flask import Flask, Response, jsonify, redirect, render_template, request, url_for, session, stream_with_context
+from flask.json.provider import DefaultJSONProvider
 from dotenv import load_dotenv
-from database import get_chat_history, test_connection
+from database import get_chat_history, iter_chat_history, test_connection, HISTORY_PAGE_SIZE, HISTORY_MAX_PAGE_SIZE
+from storage import (
+    init_db, read_webhooks, get_webhook_by_id, insert_webhook,
+    update_webhook_by_id, delete_webhook_by_id, delete_all_webhooks,
+    read_users, add_user,
+    get_user_chats, get_chat_by_id, insert_chat, update_chat, delete_chat, touch_chat,
+    create_webhook_task, complete_webhook_task, get_webhook_task, delete_webhook_task,
+)
+
+try:
+    import orjson
+except ImportError:  # orjson is optional; fall back to the stdlib json module
+    orjson = None
 
 # Load environment variables from .env file
 load_dotenv()
 
+
+class OrjsonProvider(DefaultJSONProvider):
+    """Flask JSON provider that uses orjson for request parsing and jsonify.
+
+    Calls with extra arguments, such as the object_hook Flask 2.2/2.3 pass when
+    decoding the session cookie, go to the stdlib implementation, which honours them.
+    """
+
+    def dumps(self, obj, **kwargs):
+        if kwargs:
+            return super().dumps(obj, **kwargs)
+        return orjson.dumps(obj, default=self.default, option=orjson.OPT_NON_STR_KEYS).decode()
+
+    def loads(self, s, **kwargs):
+        if kwargs:
+            return super().loads(s, **kwargs)
+        return orjson.loads(s)
+
+
 # Initialize Flask App
 app = Flask(__name__)
+if orjson:
+    app.json = OrjsonProvider(app)
 app.secret_key = os.environ.get('SECRET_KEY', 'dev-secret-key-change-in-production')
 
-# Define the path for the data file
-DATA_DIR = os.path.join(os.path.dirname(__file__), 'data')
-WEBHOOK_FILE = os.path.join(DATA_DIR, 'webhooks.json')
-USERS_FILE = os.path.join(DATA_DIR, 'users.json')
-CHATS_FILE = os.path.join(DATA_DIR, 'chats.json')
+# Create the data directory and database once at startup
+init_db()
 
 # Default JSON field names for webhook communication
 DEFAULT_SESSION_ID_KEY = 'session_id'
 DEFAULT_USER_MESSAGE_KEY = 'user_message'
 DEFAULT_REPLY_KEY = 'reply'
 
+# Date in default chat titles, e.g. "Oct 8, 14:35"; Windows spells the no-padding flag %#d instead of %-d
+CHAT_TITLE_DATE_FORMAT = "%b %#d, %H:%M" if os.name == 'nt' else "%b %-d, %H:%M"
+
+# Shared HTTP session so webhook calls reuse pooled keep-alive connections.
+# Retries only cover failures to connect; POST is not idempotent, so urllib3 never resends it after a read error.
+HTTP = requests.Session()
+# The session is shared by every user's webhook calls, so it must not remember cookies between them
+HTTP.cookies.set_policy(http.cookiejar.DefaultCookiePolicy(allowed_domains=[]))
+_http_adapter = HTTPAdapter(pool_connections=20, pool_maxsize=50,
+                            max_retries=Retry(total=2, backoff_factor=0.2))
+HTTP.mount('http://', _http_adapter)
+HTTP.mount('https://', _http_adapter)
+
+# Webhook calls run on these threads so a slow n8n reply does not hold a request worker
+WEBHOOK_EXECUTOR = ThreadPoolExecutor(max_workers=int(os.environ.get('WEBHOOK_WORKERS', '64')),
+                                      thread_name_prefix='webhook')
+
 # --- Helper Functions ---
 
 def validate_json_key_name(key_name):
@@ -40,139 +93,10 @@ def validate_json_key_name(key_name):
     # Allow letters, numbers, underscores, and spaces
     return bool(re.match(r'^[a-zA-Z0-9_ ]+$', key_name))
 
-def ensure_data_file():
-    """Ensures the data directory and data files exist."""
-    os.makedirs(DATA_DIR, exist_ok=True)
-    if not os.path.exists(WEBHOOK_FILE):
-        with open(WEBHOOK_FILE, 'w') as f:
-            json.dump({"webhooks": []}, f)
-    if not os.path.exists(USERS_FILE):
-        with open(USERS_FILE, 'w') as f:
-            json.dump({"users": []}, f)
-    if not os.path.exists(CHATS_FILE):
-        with open(CHATS_FILE, 'w') as f:
-            json.dump({"chats": []}, f)
-        with open(USERS_FILE, 'w') as f:
-            json.dump({"users": []}, f)
-
-def read_webhooks():
-    """Reads all webhooks from the JSON file."""
-    ensure_data_file()
-    try:
-        with open(WEBHOOK_FILE, 'r') as f:
-            data = json.load(f)
-            # Handle old format migration
-            if "active_webhook" in data:
-                # Migrate old format to new format
-                old_webhook = data.get("active_webhook")
-                if old_webhook:
-                    webhooks = [{"id": str(uuid.uuid4()), "name": "Default Webhook", "url": old_webhook}]
-                else:
-                    webhooks = []
-                data = {"webhooks": webhooks}
-                with open(WEBHOOK_FILE, 'w') as f:
-                    json.dump(data, f, indent=4)
-            return data.get("webhooks", [])
-    except (json.JSONDecodeError, FileNotFoundError):
-        return []
-
-def write_webhooks(webhooks):
-    """Writes the webhooks list to the JSON file."""
-    ensure_data_file()
-    with open(WEBHOOK_FILE, 'w') as f:
-        json.dump({"webhooks": webhooks}, f, indent=4)
-
-def get_webhook_by_id(webhook_id):
-    """Gets a specific webhook by its ID."""
-    webhooks = read_webhooks()
-    for webhook in webhooks:
-        if webhook.get("id") == webhook_id:
-            return webhook
-    return None
-
-def read_users():
-    """Reads all users from the JSON file."""
-    ensure_data_file()
-    try:
-        with open(USERS_FILE, 'r') as f:
-            data = json.load(f)
-            return data.get("users", [])
-    except (json.JSONDecodeError, FileNotFoundError):
-        return []
-
-def write_users(users):
-    """Writes the users list to the JSON file."""
-    ensure_data_file()
-    with open(USERS_FILE, 'w') as f:
-        json.dump({"users": users}, f, indent=4)
-
-def get_user_by_username(username):
-    """Gets a specific user by username."""
-    users = read_users()
-    for user in users:
-        if user.get("username").lower() == username.lower():
-            return user
-    return None
-
-def add_user(username):
-    """Adds a new user to the users list."""
-    from datetime import datetime
-    users = read_users()
-    
-    # Check if user already exists
-    existing_user = get_user_by_username(username)
-    if existing_user:
-        # Update last login
-        for user in users:
-            if user.get("username").lower() == username.lower():
-                user['last_login'] = datetime.now().isoformat()
-                break
-    else:
-        # Add new user
-        new_user = {
-            "id": str(uuid.uuid4()),
-            "username": username,
-            "created_at": datetime.now().isoformat(),
-            "last_login": datetime.now().isoformat()
-        }
-        users.append(new_user)
-    
-    write_users(users)
-    return get_user_by_username(username)
-
-def read_chats():
-    """Reads all chats from the JSON file."""
-    ensure_data_file()
-    try:
-        with open(CHATS_FILE, 'r') as f:
-            data = json.load(f)
-            return data.get("chats", [])
-    except (json.JSONDecodeError, FileNotFoundError):
-        return []
-
-def write_chats(chats):
-    """Writes the chats list to the JSON file."""
-    ensure_data_file()
-    with open(CHATS_FILE, 'w') as f:
-        json.dump({"chats": chats}, f, indent=4)
-
-def get_user_chats(user_id):
-    """Gets all chats for a specific user."""
-    chats = read_chats()
-    return [chat for chat in chats if chat.get("user_id") == user_id]
-
-def get_chat_by_id(chat_id):
-    """Gets a specific chat by its ID."""
-    chats = read_chats()
-    for chat in chats:
-        if chat.get("id") == chat_id:
-            return chat
-    return None
-
 def create_new_chat(user_id, title=None, webhook_id=None, table_name=None):
     """Creates a new chat for a user."""
-    from datetime import datetime
-    chats = read_chats()
+    now = datetime.now()
+    now_iso = now.isoformat()
     
     # Generate a new session_id for this chat
     session_id = str(uuid.uuid4())
@@ -180,7 +104,6 @@ def create_new_chat(user_id, title=None, webhook_id=None, table_name=None):
     # If no title provided, generate one with date and time
     if not title:
         user_chats_count = len(get_user_chats(user_id))
-        now = datetime.now()
         # Get webhook name if webhook_id is provided
         webhook_name = "Chat"
         if webhook_id:
@@ -188,7 +111,7 @@ def create_new_chat(user_id, title=None, webhook_id=None, table_name=None):
             if webhook:
                 webhook_name = webhook.get("name", "Chat")
         # Format: webhook name-1 (Oct 8, 14:35)
-        formatted_date = now.strftime("%b %-d, %H:%M") if os.name != 'nt' else now.strftime("%b %d, %H:%M").replace(" 0", " ")
+        formatted_date = now.strftime(CHAT_TITLE_DATE_FORMAT)
         title = f"{webhook_name}-{user_chats_count + 1} ({formatted_date})"
     
     # Default to n8n_chat_histories if no table_name provided
@@ -202,40 +125,13 @@ def create_new_chat(user_id, title=None, webhook_id=None, table_name=None):
         "title": title,
         "table_name": table_name,
         "webhook_id": webhook_id,
-        "created_at": datetime.now().isoformat(),
-        "updated_at": datetime.now().isoformat()
+        "created_at": now_iso,
+        "updated_at": now_iso
     }
     
-    chats.append(new_chat)
-    write_chats(chats)
+    insert_chat(new_chat)
     return new_chat
 
-def update_chat(chat_id, updates):
-    """Updates a chat's information."""
-    from datetime import datetime
-    chats = read_chats()
-    
-    for chat in chats:
-        if chat.get("id") == chat_id:
-            if "title" in updates:
-                chat["title"] = updates["title"]
-            chat["updated_at"] = datetime.now().isoformat()
-            write_chats(chats)
-            return chat
-    
-    return None
-
-def delete_chat(chat_id):
-    """Deletes a chat."""
-    chats = read_chats()
-    initial_length = len(chats)
-    chats = [c for c in chats if c.get("id") != chat_id]
-    
-    if len(chats) < initial_length:
-        write_chats(chats)
-        return True
-    return False
-
 # --- Authentication Decorator ---
 
 def login_required(f):
@@ -272,7 +168,7 @@ def login():
     if len(username) < 2:
         return jsonify({"error": "Username must be at least 2 characters long."}), 400
     
-    # Add or update user in the users.json file
+    # Add or update user in the users table
     user = add_user(username)
     
     # Store username in session
@@ -287,8 +183,8 @@ def login():
         session['chat_id'] = default_chat['id']
         session['session_id'] = default_chat['session_id']
     else:
-        # Use the most recent chat (last updated)
-        latest_chat = sorted(user_chats, key=lambda x: x.get('updated_at', ''), reverse=True)[0]
+        # Use the most recent chat (get_user_chats keeps them newest first)
+        latest_chat = user_chats[0]
         session['chat_id'] = latest_chat['id']
         session['session_id'] = latest_chat['session_id']
     
@@ -483,7 +379,6 @@ def create_webhook():
     if not validate_json_key_name(reply_key):
         return jsonify({"error": f"Invalid AI Reply Key name. Use only letters, numbers, underscores, and spaces."}), 400
     
-    webhooks = read_webhooks()
     new_webhook = {
         "id": str(uuid.uuid4()),
         "name": data['name'],
@@ -493,8 +388,7 @@ def create_webhook():
         "userMessageKey": user_message_key,
         "replyKey": reply_key
     }
-    webhooks.append(new_webhook)
-    write_webhooks(webhooks)
+    insert_webhook(new_webhook)
     return jsonify({"message": "Webhook created successfully.", "webhook": new_webhook}), 201
 
 @app.route('/api/webhooks/<webhook_id>', methods=['PUT'])
@@ -504,57 +398,42 @@ def update_webhook(webhook_id):
     if not data or ('name' not in data and 'url' not in data and 'tableName' not in data and 'sessionIdKey' not in data and 'userMessageKey' not in data and 'replyKey' not in data):
         return jsonify({"error": "Missing required fields in request body."}), 400
     
-    webhooks = read_webhooks()
-    webhook_found = False
-    
-    for webhook in webhooks:
-        if webhook.get("id") == webhook_id:
-            if 'name' in data:
-                webhook['name'] = data['name']
-            if 'url' in data:
-                webhook['url'] = data['url']
-            if 'tableName' in data:
-                webhook['tableName'] = data['tableName']
-            
-            # Update custom JSON field names with validation
-            if 'sessionIdKey' in data:
-                session_id_key = data['sessionIdKey'].strip()
-                if not validate_json_key_name(session_id_key):
-                    return jsonify({"error": "Invalid Session ID Key name. Use only letters, numbers, underscores, and spaces."}), 400
-                webhook['sessionIdKey'] = session_id_key
-            
-            if 'userMessageKey' in data:
-                user_message_key = data['userMessageKey'].strip()
-                if not validate_json_key_name(user_message_key):
-                    return jsonify({"error": "Invalid User Message Key name. Use only letters, numbers, underscores, and spaces."}), 400
-                webhook['userMessageKey'] = user_message_key
-            
-            if 'replyKey' in data:
-                reply_key = data['replyKey'].strip()
-                if not validate_json_key_name(reply_key):
-                    return jsonify({"error": "Invalid AI Reply Key name. Use only letters, numbers, underscores, and spaces."}), 400
-                webhook['replyKey'] = reply_key
-            
-            webhook_found = True
-            break
-    
-    if not webhook_found:
+    updates = {}
+    for key in ('name', 'url', 'tableName'):
+        if key in data:
+            updates[key] = data[key]
+    
+    # Update custom JSON field names with validation
+    if 'sessionIdKey' in data:
+        session_id_key = data['sessionIdKey'].strip()
+        if not validate_json_key_name(session_id_key):
+            return jsonify({"error": "Invalid Session ID Key name. Use only letters, numbers, underscores, and spaces."}), 400
+        updates['sessionIdKey'] = session_id_key
+    
+    if 'userMessageKey' in data:
+        user_message_key = data['userMessageKey'].strip()
+        if not validate_json_key_name(user_message_key):
+            return jsonify({"error": "Invalid User Message Key name. Use only letters, numbers, underscores, and spaces."}), 400
+        updates['userMessageKey'] = user_message_key
+    
+    if 'replyKey' in data:
+        reply_key = data['replyKey'].strip()
+        if not validate_json_key_name(reply_key):
+            return jsonify({"error": "Invalid AI Reply Key name. Use only letters, numbers, underscores, and spaces."}), 400
+        updates['replyKey'] = reply_key
+    
+    webhook = update_webhook_by_id(webhook_id, updates)
+    if not webhook:
         return jsonify({"error": "Webhook not found."}), 404
     
-    write_webhooks(webhooks)
     return jsonify({"message": "Webhook updated successfully.", "webhook": webhook}), 200
 
 @app.route('/api/webhooks/<webhook_id>', methods=['DELETE'])
 def delete_webhook(webhook_id):
     """API endpoint to delete a webhook."""
-    webhooks = read_webhooks()
-    initial_length = len(webhooks)
-    webhooks = [w for w in webhooks if w.get("id") != webhook_id]
-    
-    if len(webhooks) == initial_length:
+    if not delete_webhook_by_id(webhook_id):
         return jsonify({"error": "Webhook not found."}), 404
     
-    write_webhooks(webhooks)
     return jsonify({"message": "Webhook deleted successfully."}), 200
 
 # Legacy API endpoints for backward compatibility (deprecated)
@@ -578,29 +457,29 @@ def update_webhook_legacy():
     
     if webhooks and len(webhooks) > 0:
         # Update first webhook
-        webhooks[0]['url'] = new_url
+        update_webhook_by_id(webhooks[0]['id'], {"url": new_url})
     else:
         # Create new webhook
-        webhooks.append({
+        insert_webhook({
             "id": str(uuid.uuid4()),
             "name": "Default Webhook",
             "url": new_url
         })
     
-    write_webhooks(webhooks)
     return jsonify({"message": "Webhook updated successfully.", "webhook_url": new_url}), 200
 
 @app.route('/api/webhook', methods=['DELETE'])
 def delete_webhook_legacy():
     """API endpoint to remove all webhooks (legacy support)."""
-    write_webhooks([])
+    delete_all_webhooks()
     return jsonify({"message": "Webhook deleted successfully."}), 200
 
 @app.route('/api/chat/info', methods=['GET'])
 @login_required
 def get_chat_info_api():
     """API endpoint to retrieve current chat information including webhook details."""
-    chat_id = session.get('chat_id')
+    sess = dict(session)
+    chat_id = sess.get('chat_id')
     
     if not chat_id:
         return jsonify({"error": "No active chat found."}), 404
@@ -609,8 +488,7 @@ def get_chat_info_api():
     if not chat:
         return jsonify({"error": "Chat not found."}), 404
     
-    user_id = session.get('user_id')
-    if chat.get("user_id") != user_id:
+    if chat.get("user_id") != sess.get('user_id'):
         return jsonify({"error": "Unauthorized."}), 403
     
     # Get webhook information if available
@@ -631,13 +509,22 @@ def get_chat_info_api():
 @app.route('/api/chat/history', methods=['GET'])
 @login_required
 def get_chat_history_api():
-    """API endpoint to retrieve chat history for the current or specified chat."""
+    """API endpoint to retrieve chat history for the current or specified chat.
+    
+    Returns the newest page of messages; pass ?before_id=<next_before_id> to page backwards.
+    Clients that send "Accept: application/x-ndjson" get the page streamed as one JSON
+    message per line, followed by a summary line with "done": true.
+    """
     # Allow getting history for a specific chat_id via query parameter
     chat_id = request.args.get('chat_id')
+    limit = request.args.get('limit', HISTORY_PAGE_SIZE, type=int)
+    limit = max(1, min(limit, HISTORY_MAX_PAGE_SIZE))
+    before_id = request.args.get('before_id', type=int)
+    sess = dict(session)
     
     if chat_id:
         # Get history for specific chat
-        user_id = session.get('user_id')
+        user_id = sess.get('user_id')
         chat = get_chat_by_id(chat_id)
         
         if not chat:
@@ -647,52 +534,34 @@ def get_chat_history_api():
             return jsonify({"error": "Unauthorized."}), 403
         
         session_id = chat['session_id']
-        table_name = chat.get('table_name', 'n8n_chat_histories')
+        table_name = chat.get('table_name') or 'n8n_chat_histories'
     else:
         # Get history for current active chat
-        if 'session_id' not in session:
+        if 'session_id' not in sess:
             return jsonify({"history": [], "message": "No active chat found."}), 200
         
-        session_id = session['session_id']
-        chat_id = session.get('chat_id')
+        session_id = sess['session_id']
+        chat_id = sess.get('chat_id')
         
         # Get table_name from current chat
         chat = get_chat_by_id(chat_id) if chat_id else None
-        table_name = chat.get('table_name', 'n8n_chat_histories') if chat else 'n8n_chat_histories'
+        table_name = (chat.get('table_name') if chat else None) or 'n8n_chat_histories'
+    
+    if request.accept_mimetypes.best_match(['application/json', 'application/x-ndjson']) == 'application/x-ndjson':
+        return Response(stream_with_context(stream_chat_history(chat_id, session_id, table_name, limit, before_id)),
+                        mimetype='application/x-ndjson')
     
     try:
-        # Get raw history from database using the table_name
-        raw_history = get_chat_history(session_id, table_name)
-        
-        # Transform the history to frontend-friendly format
-        formatted_history = []
-        for msg in raw_history:
-            message_data = msg.get('message', {})
-            
-            # Handle different message formats
-            if isinstance(message_data, dict):
-                msg_type = message_data.get('type', '')
-                msg_content = message_data.get('content', '')
-                
-                # Map database types to frontend roles
-                if msg_type == 'human':
-                    role = 'user'
-                elif msg_type == 'ai':
-                    role = 'assistant'
-                else:
-                    # Skip unknown message types
-                    continue
-                
-                formatted_history.append({
-                    'role': role,
-                    'content': msg_content
-                })
+        # Get the formatted history page from the database using the table_name
+        history = get_chat_history(session_id, table_name, limit, before_id)
         
         return jsonify({
             "chat_id": chat_id,
             "session_id": session_id,
-            "history": formatted_history,
-            "total_messages": len(formatted_history)
+            "history": history,
+            "total_messages": len(history),
+            "has_more": len(history) == limit,
+            "next_before_id": history[0]['id'] if history else None
         }), 200
         
     except Exception as e:
@@ -703,9 +572,34 @@ def get_chat_history_api():
             "session_id": session_id,
             "history": [],
             "total_messages": 0,
+            "has_more": False,
+            "next_before_id": None,
             "error": f"Could not load chat history: {str(e)}"
         }), 200
 
+def stream_chat_history(chat_id, session_id, table_name, limit, before_id):
+    """Yields a history page as NDJSON lines, one per message, then a summary line."""
+    count = 0
+    first_id = None
+    summary = {"chat_id": chat_id, "session_id": session_id, "done": True}
+    try:
+        for message in iter_chat_history(session_id, table_name, limit, before_id):
+            if first_id is None:
+                first_id = message['id']
+            count += 1
+            yield app.json.dumps(message) + "\n"
+    except Exception as e:
+        # Headers are already sent, so report the error in the summary line
+        print(f"Error streaming chat history: {e}")
+        summary["error"] = f"Could not load chat history: {str(e)}"
+    
+    summary.update({
+        "total_messages": count,
+        "has_more": count == limit and "error" not in summary,
+        "next_before_id": first_id
+    })
+    yield app.json.dumps(summary) + "\n"
+
 @app.route('/chat/send', methods=['POST'])
 @login_required
 def send_message():
@@ -716,12 +610,15 @@ def send_message():
 
     user_message = user_data['message']
     
+    # Read the session once; each access through the session proxy costs a context lookup
+    sess = dict(session)
+    
     # Ensure user has an active chat
-    if 'session_id' not in session or 'chat_id' not in session:
+    if 'session_id' not in sess or 'chat_id' not in sess:
         return jsonify({"error": "No active chat. Please create a chat first."}), 400
     
-    session_id = session['session_id']
-    chat_id = session.get('chat_id')
+    session_id = sess['session_id']
+    chat_id = sess['chat_id']
     
     # Get the current chat to find its associated webhook
     chat = get_chat_by_id(chat_id)
@@ -745,11 +642,10 @@ def send_message():
         webhook_url = webhook['url']
         table_name = webhook.get('tableName', 'n8n_chat_histories')
     
-    username = session.get('username', 'Anonymous')
+    username = sess.get('username', 'Anonymous')
     
-    # Update the chat's updated_at timestamp
-    if chat_id:
-        update_chat(chat_id, {})
+    # Update the chat's updated_at timestamp (written to storage in batches)
+    touch_chat(chat_id)
 
     # Get custom JSON field names with defaults (for backward compatibility)
     session_id_key = webhook.get('sessionIdKey', DEFAULT_SESSION_ID_KEY)
@@ -763,30 +659,67 @@ def send_message():
         "username": username
     }
     
+    # Call the webhook in the background; the client polls /chat/reply/<task_id> for the result
+    task_id = str(uuid.uuid4())
+    create_webhook_task(task_id, sess.get('user_id'))
+    WEBHOOK_EXECUTOR.submit(run_webhook_task, task_id, webhook_url, payload, reply_key)
+    
+    return jsonify({"task_id": task_id}), 202
+
+@app.route('/chat/reply/<task_id>', methods=['GET'])
+@login_required
+def get_reply(task_id):
+    """Returns the webhook reply for a message sent with /chat/send, or 202 while it is pending."""
+    task = get_webhook_task(task_id)
+    if not task or task.get('user_id') != session.get('user_id'):
+        return jsonify({"error": "Reply not found."}), 404
+    
+    if task['response'] is None:
+        return jsonify({"status": "pending"}), 202
+    
+    delete_webhook_task(task_id)
+    return jsonify(task['response']), task['status_code']
+
+def run_webhook_task(task_id, webhook_url, payload, reply_key):
+    """Calls the webhook on a background thread and stores the outcome for the polling client."""
+    try:
+        response, status_code = call_webhook(webhook_url, payload, reply_key)
+    except Exception as e:
+        print(f"Unexpected error calling webhook: {e}")
+        response, status_code = {"error": f"Unexpected error calling the webhook: {e}"}, 500
+    complete_webhook_task(task_id, response, status_code)
+
+def call_webhook(webhook_url, payload, reply_key):
+    """Sends the payload to the webhook and returns the (JSON body, HTTP status) to hand back to the client."""
     try:
         # Send the message to the external webhook URL
         # n8n will handle saving the chat history
-        response = requests.post(webhook_url, json=payload, timeout=120)
+        if orjson:
+            response = HTTP.post(webhook_url, data=orjson.dumps(payload),
+                                 headers={"Content-Type": "application/json"}, timeout=120)
+        else:
+            response = HTTP.post(webhook_url, json=payload, timeout=120)
         response.raise_for_status()  # Raises an HTTPError for bad responses (4xx or 5xx)
         
-        webhook_response = response.json()
+        webhook_response = orjson.loads(response.content) if orjson else response.json()
         
         # Use custom reply key to extract the response
         if reply_key not in webhook_response:
-             return jsonify({"error": f"Webhook response is missing the '{reply_key}' key."}), 500
+            return {"error": f"Webhook response is missing the '{reply_key}' key."}, 500
 
-        return jsonify({"reply": webhook_response[reply_key]})
+        return {"reply": webhook_response[reply_key]}, 200
 
     except requests.exceptions.Timeout:
-        return jsonify({"error": "The request to the webhook timed out."}), 504
+        return {"error": "The request to the webhook timed out."}, 504
     except requests.exceptions.RequestException as e:
         # This catches connection errors, invalid URLs, etc.
-        return jsonify({"error": f"Webhook call failed. Please check the URL and ensure the endpoint is running. Details: {e}"}), 500
+        return {"error": f"Webhook call failed. Please check the URL and ensure the endpoint is running. Details: {e}"}, 500
     except json.JSONDecodeError:
-        return jsonify({"error": "Failed to decode JSON response from the webhook."}), 500
+        return {"error": "Failed to decode JSON response from the webhook."}, 500
 
 
 # --- Main Execution ---
 
+# Development server only; in production run "gunicorn app:app" (see gunicorn.conf.py)
 if __name__ == '__main__':
-    app.run(debug=True, port=5000)
+    app.run(debug=os.environ.get('FLASK_ENV', 'development') == 'development', port=5000)
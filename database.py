@@ -5,11 +5,14 @@ Uses existing PostgreSQL database with n8n_chat_histories table.
 NOTE: This module only READS chat history.
 All chat messages are saved by n8n, not by this application.
 """
+import atexit
 import os
-import json
+import threading
 import psycopg2
+from psycopg2 import sql
 from psycopg2.extras import RealDictCursor
-from typing import List, Dict, Any
+from psycopg2.pool import ThreadedConnectionPool
+from typing import List, Dict, Any, Iterator, Optional
 from dotenv import load_dotenv
 
 # Load environment variables from .env file
@@ -24,10 +27,44 @@ DB_CONFIG = {
     'password': os.environ.get('DB_PASSWORD', ''),
 }
 
+# Connection pool limits, overridable from the environment
+DB_POOL_MIN = int(os.environ.get('DB_POOL_MIN', '1'))
+DB_POOL_MAX = int(os.environ.get('DB_POOL_MAX', '10'))
+
+# Default and maximum number of messages returned per history page
+HISTORY_PAGE_SIZE = 50
+HISTORY_MAX_PAGE_SIZE = 200
+
+# Rows fetched per round trip when streaming history from a server-side cursor
+HISTORY_FETCH_SIZE = 100
+
+# Shared connection pool, created on first use so importing this module never touches the network
+_pool = None
+_pool_lock = threading.Lock()
+
+def get_pool() -> ThreadedConnectionPool:
+    """
+    Returns the process-wide connection pool, creating it on first call.
+    
+    Returns:
+        ThreadedConnectionPool: The shared PostgreSQL connection pool
+    
+    Raises:
+        psycopg2.Error: If the initial connections cannot be opened
+    """
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ThreadedConnectionPool(DB_POOL_MIN, DB_POOL_MAX, **DB_CONFIG)
+                atexit.register(_pool.closeall)
+    return _pool
+
 
 def get_db_connection():
     """
-    Creates and returns a connection to the PostgreSQL database.
+    Borrows a connection to the PostgreSQL database from the pool.
+    Every connection must be handed back with release_db_connection().
     
     Returns:
         psycopg2.connection: Database connection object
@@ -36,87 +73,129 @@ def get_db_connection():
         psycopg2.Error: If connection fails
     """
     try:
-        conn = psycopg2.connect(**DB_CONFIG)
-        return conn
+        return get_pool().getconn()
     except psycopg2.Error as e:
         print(f"Database connection error: {e}")
         raise
 
 
-def get_chat_history(session_id: str, table_name: str = "n8n_chat_histories") -> List[Dict[str, Any]]:
+def release_db_connection(conn):
     """
-    Retrieves all chat messages for a given session_id from a specific table, ordered by id.
+    Returns a borrowed connection to the pool, discarding it if it is broken.
+    
+    Args:
+        conn (psycopg2.connection): Connection obtained from get_db_connection()
+    """
+    discard = bool(conn.closed)
+    if not discard:
+        try:
+            # End the implicit read transaction so the connection is clean for the next caller
+            conn.rollback()
+        except psycopg2.Error as e:
+            print(f"Discarding broken pooled connection: {e}")
+            discard = True
+    get_pool().putconn(conn, close=discard)
+
+
+def iter_chat_history(session_id: str, table_name: str = "n8n_chat_histories",
+                      limit: int = HISTORY_PAGE_SIZE, before_id: Optional[int] = None) -> Iterator[Dict[str, Any]]:
+    """
+    Streams one page of chat messages for a given session_id from a specific table.
+    The page holds the newest `limit` messages older than `before_id`, yielded oldest first.
+    
+    Only human and AI messages are returned. The message JSON is projected in SQL
+    into the role/content shape the frontend expects, so no per-row parsing happens here.
+    The message column must be json or jsonb, as n8n creates it. It is cast with ::jsonb,
+    so on a text column a single row that is not valid JSON fails the whole query.
+    Rows are read through a server-side cursor, so memory use does not grow with the page size.
+    The pooled connection is held until the generator is exhausted or closed.
     
     Args:
         session_id (str): The session identifier for the chat
         table_name (str): The name of the database table to query (default: "n8n_chat_histories")
+        limit (int): Maximum number of messages to return (default: 50)
+        before_id (int, optional): Only return messages with an id lower than this one
     
-    Returns:
-        list: A list of message dictionaries, each containing:
+    Yields:
+        dict: A message dictionary, in id order, containing:
               - id: The database record ID
-              - session_id: The session identifier
-              - message: The parsed JSON message object
+              - role: "user" for human messages, "assistant" for AI messages
+              - content: The message text
+    
+    Raises:
+        psycopg2.Error: If the query fails
+    """
+    conn = get_db_connection()
+    cursor = None
+    try:
+        # Fetch the newest page (below before_id) using the (session_id, id DESC) index,
+        # then put it back in chronological order
+        # Using parameterized table name safely with psycopg2.sql
+        conditions = [sql.SQL("session_id = %s"), sql.SQL("message::jsonb->>'type' IN ('human', 'ai')")]
+        params = [session_id]
+        if before_id is not None:
+            conditions.append(sql.SQL("id < %s"))
+            params.append(before_id)
+        params.append(limit)
+        query = sql.SQL("""
+            SELECT id, role, content FROM (
+                SELECT id,
+                       CASE message::jsonb->>'type' WHEN 'human' THEN 'user' WHEN 'ai' THEN 'assistant' END AS role,
+                       message::jsonb->>'content' AS content
+                FROM {}
+                WHERE {}
+                ORDER BY id DESC
+                LIMIT %s
+            ) AS page
+            ORDER BY id ASC
+        """).format(sql.Identifier(table_name), sql.SQL(" AND ").join(conditions))
+        
+        # Named cursor = server-side cursor; rows arrive in batches of itersize
+        cursor = conn.cursor(name='chat_history', cursor_factory=RealDictCursor)
+        cursor.itersize = HISTORY_FETCH_SIZE
+        cursor.execute(query, params)
+        
+        for row in cursor:
+            yield dict(row)
+        
+    finally:
+        if cursor:
+            cursor.close()
+        release_db_connection(conn)
+
+
+def get_chat_history(session_id: str, table_name: str = "n8n_chat_histories",
+                     limit: int = HISTORY_PAGE_SIZE, before_id: Optional[int] = None) -> List[Dict[str, Any]]:
+    """
+    Retrieves one page of chat messages for a given session_id from a specific table.
+    See iter_chat_history() for the paging rules and message format.
+    
+    Args:
+        session_id (str): The session identifier for the chat
+        table_name (str): The name of the database table to query (default: "n8n_chat_histories")
+        limit (int): Maximum number of messages to return (default: 50)
+        before_id (int, optional): Only return messages with an id lower than this one
+    
+    Returns:
+        list: The page of messages ordered by id, or an empty list on error
               
     Example:
-        >>> get_chat_history("abc-123", "sales_chats")
+        >>> get_chat_history("abc-123", "sales_chats", limit=2)
         [
             {
                 "id": 1,
-                "session_id": "abc-123",
-                "message": {
-                    "type": "human",
-                    "content": "Hello, create a class /celcom_notification",
-                    "additional_kwargs": {},
-                    "response_metadata": {}
-                }
+                "role": "user",
+                "content": "Hello, create a class /celcom_notification"
             },
             {
                 "id": 2,
-                "session_id": "abc-123",
-                "message": {
-                    "type": "ai",
-                    "content": "Here is the generated class structure...",
-                    "additional_kwargs": {},
-                    "response_metadata": {}
-                }
+                "role": "assistant",
+                "content": "Here is the generated class structure..."
             }
         ]
     """
-    conn = None
-    cursor = None
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor(cursor_factory=RealDictCursor)
-        
-        # Query all messages for the session from the specified table, ordered by id
-        # Using parameterized table name safely with psycopg2.sql
-        from psycopg2 import sql
-        query = sql.SQL("""
-            SELECT id, session_id, message
-            FROM {}
-            WHERE session_id = %s
-            ORDER BY id ASC
-        """).format(sql.Identifier(table_name))
-        
-        cursor.execute(query, (session_id,))
-        
-        rows = cursor.fetchall()
-        
-        # Parse JSON message strings back to dictionaries
-        result = []
-        for row in rows:
-            message_dict = dict(row)
-            # Parse the JSON string in the message column
-            if isinstance(message_dict['message'], str):
-                try:
-                    message_dict['message'] = json.loads(message_dict['message'])
-                except json.JSONDecodeError as e:
-                    print(f"Error parsing message JSON for id {row['id']}: {e}")
-                    # Keep the original string if parsing fails
-                    pass
-            result.append(message_dict)
-        
-        return result
+        return list(iter_chat_history(session_id, table_name, limit, before_id))
         
     except psycopg2.Error as e:
         print(f"Error retrieving chat history: {e}")
@@ -125,12 +204,6 @@ def get_chat_history(session_id: str, table_name: str = "n8n_chat_histories") ->
     except Exception as e:
         print(f"Unexpected error retrieving chat history: {e}")
         return []
-        
-    finally:
-        if cursor:
-            cursor.close()
-        if conn:
-            conn.close()
 
 
 def test_connection() -> bool:
@@ -140,13 +213,16 @@ def test_connection() -> bool:
     Returns:
         bool: True if connection is successful, False otherwise
     """
+    conn = None
     try:
         conn = get_db_connection()
         cursor = conn.cursor()
         cursor.execute("SELECT 1")
         cursor.close()
-        conn.close()
         return True
     except Exception as e:
         print(f"Connection test failed: {e}")
         return False
+    finally:
+        if conn:
+            release_db_connection(conn)
@@ -0,0 +1,25 @@
+"""
+Gunicorn settings for running the chat app in production:
+
+    gunicorn app:app
+
+Gunicorn loads this file automatically from the working directory.
+Every setting can be overridden from the environment.
+"""
+import multiprocessing
+import os
+
+# Listen address (PORT is set by most hosting platforms)
+bind = f"0.0.0.0:{os.environ.get('PORT', '5000')}"
+
+# One worker process per CPU core, each serving requests on several threads
+workers = int(os.environ.get('WEB_CONCURRENCY', multiprocessing.cpu_count()))
+worker_class = 'gthread'
+threads = int(os.environ.get('GUNICORN_THREADS', '4'))
+
+# Webhook calls run in the background, so requests themselves stay short
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', '30'))
+graceful_timeout = 30
+
+accesslog = '-'
+errorlog = '-'
@@ -0,0 +1,651 @@
+"""
+Storage module for application metadata (users, chats and webhooks).
+Uses a local SQLite database in the data directory.
+
+NOTE: Chat messages are NOT stored here.
+They live in PostgreSQL and are read through database.py.
+"""
+import json
+import os
+import atexit
+import sqlite3
+import threading
+import uuid
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from typing import List, Dict, Any, Optional
+
+try:
+    import orjson
+except ImportError:  # orjson is optional; fall back to the stdlib json module
+    orjson = None
+
+# Define the paths for the data files
+DATA_DIR = os.path.join(os.path.dirname(__file__), 'data')
+DB_FILE = os.path.join(DATA_DIR, 'app.db')
+
+# Pending webhook replies live in their own database so their churn does not
+# invalidate the metadata caches of other processes (see _sync_caches)
+TASKS_DB_FILE = os.path.join(DATA_DIR, 'tasks.db')
+
+# Legacy JSON files, imported once into the database
+WEBHOOK_FILE = os.path.join(DATA_DIR, 'webhooks.json')
+USERS_FILE = os.path.join(DATA_DIR, 'users.json')
+CHATS_FILE = os.path.join(DATA_DIR, 'chats.json')
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS users (
+    id TEXT PRIMARY KEY,
+    username TEXT NOT NULL,
+    username_lower TEXT NOT NULL UNIQUE,
+    created_at TEXT,
+    last_login TEXT
+);
+
+CREATE TABLE IF NOT EXISTS chats (
+    id TEXT PRIMARY KEY,
+    user_id TEXT NOT NULL,
+    session_id TEXT NOT NULL,
+    title TEXT,
+    table_name TEXT,
+    webhook_id TEXT,
+    created_at TEXT,
+    updated_at TEXT
+);
+
+CREATE INDEX IF NOT EXISTS idx_chats_user_updated ON chats (user_id, updated_at DESC);
+
+CREATE TABLE IF NOT EXISTS webhooks (
+    id TEXT PRIMARY KEY,
+    name TEXT,
+    url TEXT,
+    table_name TEXT,
+    session_id_key TEXT,
+    user_message_key TEXT,
+    reply_key TEXT
+);
+
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+
+# How long updated_at bumps from sent messages are buffered before being written
+TOUCH_FLUSH_DELAY = 2.0
+
+# Webhook replies nobody collected are dropped after this long
+TASK_RETENTION = timedelta(hours=1)
+
+TASKS_SCHEMA = """
+CREATE TABLE IF NOT EXISTS webhook_tasks (
+    id TEXT PRIMARY KEY,
+    user_id TEXT NOT NULL,
+    status_code INTEGER,
+    response TEXT,
+    created_at TEXT
+);
+
+CREATE INDEX IF NOT EXISTS idx_webhook_tasks_created ON webhook_tasks (created_at);
+"""
+
+CHAT_COLUMNS = ('id', 'user_id', 'session_id', 'title', 'table_name', 'webhook_id', 'created_at', 'updated_at')
+
+# User columns exposed by the API, in response order
+USER_COLUMNS = ('id', 'username', 'created_at', 'last_login')
+
+# Maps webhook table columns to the keys used by the API and the frontend
+WEBHOOK_FIELDS = (
+    ('id', 'id'),
+    ('name', 'name'),
+    ('url', 'url'),
+    ('table_name', 'tableName'),
+    ('session_id_key', 'sessionIdKey'),
+    ('user_message_key', 'userMessageKey'),
+    ('reply_key', 'replyKey'),
+)
+
+# Set once the schema has been created in this process
+_initialized = False
+_init_lock = threading.Lock()
+
+# sqlite3 connections may not be shared between threads, so keep one per thread for reads
+_local = threading.local()
+
+# All writes go through one shared connection. Its data_version only changes when
+# another process commits, which is how in-memory caches detect outside changes.
+_writer = None
+_writer_lock = threading.Lock()
+_data_version = None
+
+
+# In-memory webhook list, loaded on first use and updated directly by the webhook writers.
+# Cached dicts are copied on the way out because callers mutate them.
+_webhooks_lock = threading.Lock()
+_webhooks = None   # all webhooks in creation order, or None until loaded
+
+# In-memory user table, loaded on first use: one list per USER_COLUMNS entry in registration order,
+# plus an index from the stored username_lower column to a position in those lists
+_users_lock = threading.Lock()
+_user_columns = None   # column name -> list of values, or None until loaded
+_users_by_lower = {}   # username_lower -> position in the _user_columns lists
+
+# Connection to the webhook task database, shared by all threads
+_tasks_conn = None
+_tasks_lock = threading.Lock()
+
+# In-memory chat indices, loaded on first use and kept in sync by the chat writers
+_chats_lock = threading.RLock()
+_chats_by_id = None   # chat id -> chat dict, or None until loaded
+_chats_by_user = {}   # user id -> that user's chats, most recently updated first
+
+# updated_at bumps not yet written to the database (chat id -> timestamp), guarded by _chats_lock
+_dirty_chats = {}
+_flush_timer = None
+
+
+# --- Connection and Schema ---
+
+def get_connection() -> sqlite3.Connection:
+    """
+    Returns the SQLite connection for the current thread, creating it if needed.
+
+    Returns:
+        sqlite3.Connection: Database connection with rows accessible by column name
+    """
+    conn = getattr(_local, 'conn', None)
+    if conn is None:
+        init_db()
+        conn = sqlite3.connect(DB_FILE)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        _local.conn = conn
+    return conn
+
+
+def _writer_connection() -> sqlite3.Connection:
+    """Returns the shared writer connection, creating it if needed. Caller must hold _writer_lock."""
+    global _writer
+    if _writer is None:
+        init_db()
+        _writer = sqlite3.connect(DB_FILE, check_same_thread=False)
+        _writer.row_factory = sqlite3.Row
+        _writer.execute("PRAGMA journal_mode=WAL")
+        _writer.execute("PRAGMA synchronous=NORMAL")
+    return _writer
+
+
+@contextmanager
+def _write_transaction():
+    """Runs the enclosed statements in one transaction on the shared writer connection."""
+    with _writer_lock:
+        conn = _writer_connection()
+        with conn:
+            yield conn
+
+
+def _sync_caches():
+    """Drops every in-memory cache if another process has written to the database since the last check."""
+    global _data_version
+    with _writer_lock:
+        version = _writer_connection().execute("PRAGMA data_version").fetchone()[0]
+        changed = _data_version is not None and version != _data_version
+        _data_version = version
+    if changed:
+        _invalidate_caches()
+
+
+def _invalidate_caches():
+    """Drops all cached users, webhooks and chats."""
+    global _user_columns, _users_by_lower, _webhooks, _chats_by_id, _chats_by_user
+    with _users_lock:
+        _user_columns = None
+        _users_by_lower = {}
+    with _webhooks_lock:
+        _webhooks = None
+    with _chats_lock:
+        _chats_by_id = None
+        _chats_by_user = {}
+
+
+def init_db():
+    """
+    Ensures the data directory and database schema exist and imports legacy JSON data.
+    Only does work on the first call in a process; call it once at startup.
+    """
+    global _initialized
+    if _initialized:
+        return
+    with _init_lock:
+        if _initialized:
+            return
+        _create_schema()
+        _initialized = True
+
+
+def _create_schema():
+    """Creates the tables and runs the one-shot JSON import."""
+    os.makedirs(DATA_DIR, exist_ok=True)
+    conn = sqlite3.connect(DB_FILE)
+    try:
+        conn.executescript(SCHEMA)
+        with conn:
+            # Take the write lock before checking, so concurrently starting processes import only once
+            conn.execute("BEGIN IMMEDIATE")
+            migrated = conn.execute("SELECT value FROM meta WHERE key = 'json_migrated'").fetchone()
+            if not migrated:
+                _migrate_json_files(conn)
+                conn.execute("INSERT INTO meta (key, value) VALUES ('json_migrated', ?)",
+                             (datetime.now().isoformat(),))
+    finally:
+        conn.close()
+
+
+def _load_json_file(path: str) -> Dict[str, Any]:
+    """Loads a legacy JSON data file, returning an empty dict if it is missing or invalid."""
+    try:
+        with open(path, 'rb') as f:
+            content = f.read()
+        return orjson.loads(content) if orjson else json.loads(content)
+    except (json.JSONDecodeError, FileNotFoundError):
+        return {}
+
+
+def _migrate_json_files(conn: sqlite3.Connection):
+    """One-shot import of the legacy users.json, chats.json and webhooks.json files."""
+    for user in _load_json_file(USERS_FILE).get("users", []):
+        conn.execute(
+            "INSERT OR IGNORE INTO users (id, username, username_lower, created_at, last_login) "
+            "VALUES (?, ?, ?, ?, ?)",
+            (user.get("id"), user.get("username"), user.get("username", "").lower(),
+             user.get("created_at"), user.get("last_login"))
+        )
+
+    for chat in _load_json_file(CHATS_FILE).get("chats", []):
+        # Chats saved before tables were configurable read from the default n8n table
+        chat["table_name"] = chat.get("table_name") or "n8n_chat_histories"
+        conn.execute(
+            f"INSERT OR IGNORE INTO chats ({', '.join(CHAT_COLUMNS)}) VALUES ({', '.join('?' * len(CHAT_COLUMNS))})",
+            tuple(chat.get(column) for column in CHAT_COLUMNS)
+        )
+
+    data = _load_json_file(WEBHOOK_FILE)
+    webhooks = data.get("webhooks", [])
+    # Handle old single-webhook format
+    if data.get("active_webhook"):
+        webhooks = [{"id": str(uuid.uuid4()), "name": "Default Webhook", "url": data["active_webhook"]}]
+    _insert_webhooks(conn, webhooks)
+
+
+# --- Row Conversion ---
+
+def _row_to_webhook(row: sqlite3.Row) -> Dict[str, Any]:
+    """Converts a webhook row to the dict format used by the API, omitting unset fields."""
+    return {key: row[column] for column, key in WEBHOOK_FIELDS if row[column] is not None}
+
+
+def _row_to_user(row: sqlite3.Row) -> Dict[str, Any]:
+    """Converts a user row to the dict format used by the API."""
+    return {column: row[column] for column in USER_COLUMNS}
+
+
+def _insert_webhooks(conn: sqlite3.Connection, webhooks: List[Dict[str, Any]]):
+    """Inserts webhook dicts, preserving list order through rowid."""
+    conn.executemany(
+        f"INSERT OR REPLACE INTO webhooks ({', '.join(c for c, _ in WEBHOOK_FIELDS)}) "
+        f"VALUES ({', '.join('?' * len(WEBHOOK_FIELDS))})",
+        [tuple(webhook.get(key) for _, key in WEBHOOK_FIELDS) for webhook in webhooks]
+    )
+
+
+# --- Webhooks ---
+
+def _load_webhooks():
+    """Loads the webhook list from the database if it is not loaded. Caller must hold _webhooks_lock."""
+    global _webhooks
+    if _webhooks is None:
+        rows = get_connection().execute("SELECT * FROM webhooks ORDER BY rowid").fetchall()
+        _webhooks = [_row_to_webhook(row) for row in rows]
+
+
+def _select_webhook(conn: sqlite3.Connection, webhook_id: str) -> Optional[Dict[str, Any]]:
+    """Reads a single webhook back from the database."""
+    row = conn.execute("SELECT * FROM webhooks WHERE id = ?", (webhook_id,)).fetchone()
+    return _row_to_webhook(row) if row else None
+
+
+def read_webhooks() -> List[Dict[str, Any]]:
+    """Reads all webhooks, in creation order."""
+    _sync_caches()
+    with _webhooks_lock:
+        _load_webhooks()
+        return [dict(webhook) for webhook in _webhooks]
+
+
+def insert_webhook(webhook: Dict[str, Any]):
+    """Stores a new webhook after the existing ones."""
+    with _write_transaction() as conn:
+        _insert_webhooks(conn, [webhook])
+        stored = _select_webhook(conn, webhook["id"])
+    with _webhooks_lock:
+        if _webhooks is not None:
+            _webhooks[:] = [w for w in _webhooks if w["id"] != stored["id"]] + [stored]
+
+
+def update_webhook_by_id(webhook_id: str, updates: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """
+    Updates the given fields of a webhook in place.
+
+    Args:
+        webhook_id (str): The ID of the webhook to update
+        updates (dict): API-style keys (e.g. "tableName") mapped to their new values
+
+    Returns:
+        dict: The updated webhook, or None if no webhook has that ID
+    """
+    columns = [(column, updates[key]) for column, key in WEBHOOK_FIELDS if key in updates and key != 'id']
+    if not columns:
+        return get_webhook_by_id(webhook_id)
+
+    with _write_transaction() as conn:
+        conn.execute(
+            f"UPDATE webhooks SET {', '.join(f'{column} = ?' for column, _ in columns)} WHERE id = ?",
+            tuple(value for _, value in columns) + (webhook_id,)
+        )
+        stored = _select_webhook(conn, webhook_id)
+    if not stored:
+        return None
+    with _webhooks_lock:
+        if _webhooks is not None:
+            _webhooks[:] = [stored if w["id"] == webhook_id else w for w in _webhooks]
+    return dict(stored)
+
+
+def delete_webhook_by_id(webhook_id: str) -> bool:
+    """Deletes a webhook. Returns True if it existed."""
+    with _write_transaction() as conn:
+        cursor = conn.execute("DELETE FROM webhooks WHERE id = ?", (webhook_id,))
+    with _webhooks_lock:
+        if _webhooks is not None:
+            _webhooks[:] = [w for w in _webhooks if w["id"] != webhook_id]
+    return cursor.rowcount > 0
+
+
+def delete_all_webhooks():
+    """Deletes every stored webhook."""
+    with _write_transaction() as conn:
+        conn.execute("DELETE FROM webhooks")
+    with _webhooks_lock:
+        if _webhooks is not None:
+            _webhooks.clear()
+
+
+def get_webhook_by_id(webhook_id: str) -> Optional[Dict[str, Any]]:
+    """Gets a specific webhook by its ID."""
+    _sync_caches()
+    with _webhooks_lock:
+        _load_webhooks()
+        for webhook in _webhooks:
+            if webhook["id"] == webhook_id:
+                return dict(webhook)
+    return None
+
+
+# --- Users ---
+
+def read_users() -> List[Dict[str, Any]]:
+    """Reads all users, in registration order."""
+    _sync_caches()
+    with _users_lock:
+        _load_user_index()
+        columns = [_user_columns[column] for column in USER_COLUMNS]
+        return [dict(zip(USER_COLUMNS, values)) for values in zip(*columns)]
+
+
+def _load_user_index():
+    """Loads the user columns and username index from the database if they are not loaded. Caller must hold _users_lock."""
+    global _user_columns, _users_by_lower
+    if _user_columns is not None:
+        return
+    rows = get_connection().execute(
+        f"SELECT username_lower, {', '.join(USER_COLUMNS)} FROM users ORDER BY rowid"
+    ).fetchall()
+    _user_columns = {column: [row[column] for row in rows] for column in USER_COLUMNS}
+    _users_by_lower = {row["username_lower"]: i for i, row in enumerate(rows)}
+
+
+def get_user_by_username(username: str) -> Optional[Dict[str, Any]]:
+    """Gets a specific user by username (case-insensitive)."""
+    _sync_caches()
+    with _users_lock:
+        _load_user_index()
+        i = _users_by_lower.get(username.lower())
+        if i is None:
+            return None
+        return {column: _user_columns[column][i] for column in USER_COLUMNS}
+
+
+def add_user(username: str) -> Dict[str, Any]:
+    """Adds a new user, or updates the last login of an existing one."""
+    now = datetime.now().isoformat()
+    username_lower = username.lower()
+    with _write_transaction() as conn:
+        conn.execute(
+            "INSERT INTO users (id, username, username_lower, created_at, last_login) "
+            "VALUES (?, ?, ?, ?, ?) "
+            "ON CONFLICT(username_lower) DO UPDATE SET last_login = excluded.last_login",
+            (str(uuid.uuid4()), username, username_lower, now, now)
+        )
+        row = conn.execute(
+            f"SELECT {', '.join(USER_COLUMNS)} FROM users WHERE username_lower = ?",
+            (username_lower,)
+        ).fetchone()
+    user = _row_to_user(row)
+    with _users_lock:
+        if _user_columns is not None:
+            i = _users_by_lower.get(username_lower)
+            if i is None:
+                _users_by_lower[username_lower] = len(_user_columns["id"])
+                for column in USER_COLUMNS:
+                    _user_columns[column].append(user[column])
+            else:
+                _user_columns["last_login"][i] = user["last_login"]
+    return user
+
+
+# --- Chats ---
+
+def read_chats() -> List[Dict[str, Any]]:
+    """Reads all chats, in creation order."""
+    rows = get_connection().execute("SELECT * FROM chats ORDER BY rowid").fetchall()
+    return [dict(row) for row in rows]
+
+
+def _load_chat_index():
+    """Loads the chat indices from the database if they are not loaded. Caller must hold _chats_lock."""
+    global _chats_by_id, _chats_by_user
+    if _chats_by_id is not None:
+        return
+    chats = read_chats()
+    _chats_by_id = {chat["id"]: chat for chat in chats}
+    # Pending bumps are newer than what the database holds
+    for chat_id, updated_at in _dirty_chats.items():
+        if chat_id in _chats_by_id:
+            _chats_by_id[chat_id]["updated_at"] = updated_at
+    _chats_by_user = {}
+    for chat in sorted(chats, key=lambda c: c.get("updated_at") or "", reverse=True):
+        _chats_by_user.setdefault(chat["user_id"], []).append(chat)
+
+
+def _move_to_front(chat: Dict[str, Any]):
+    """Moves a chat to the front of its user's list after its updated_at was bumped. Caller must hold _chats_lock."""
+    user_chats = [c for c in _chats_by_user.get(chat["user_id"], []) if c["id"] != chat["id"]]
+    user_chats.insert(0, chat)
+    _chats_by_user[chat["user_id"]] = user_chats
+
+
+def get_user_chats(user_id: str) -> List[Dict[str, Any]]:
+    """Gets all chats for a specific user, most recently updated first."""
+    _sync_caches()
+    with _chats_lock:
+        _load_chat_index()
+        return [dict(chat) for chat in _chats_by_user.get(user_id, [])]
+
+
+def get_chat_by_id(chat_id: str) -> Optional[Dict[str, Any]]:
+    """Gets a specific chat by its ID."""
+    _sync_caches()
+    with _chats_lock:
+        _load_chat_index()
+        chat = _chats_by_id.get(chat_id)
+        return dict(chat) if chat else None
+
+
+def insert_chat(chat: Dict[str, Any]):
+    """Stores a new chat."""
+    with _write_transaction() as conn:
+        conn.execute(
+            f"INSERT INTO chats ({', '.join(CHAT_COLUMNS)}) VALUES ({', '.join('?' * len(CHAT_COLUMNS))})",
+            tuple(chat.get(column) for column in CHAT_COLUMNS)
+        )
+    with _chats_lock:
+        if _chats_by_id is not None and chat["id"] not in _chats_by_id:
+            cached = {column: chat.get(column) for column in CHAT_COLUMNS}
+            _chats_by_id[cached["id"]] = cached
+            _move_to_front(cached)
+
+
+def update_chat(chat_id: str, updates: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """Updates a chat's title (if given) and bumps its updated_at timestamp."""
+    now = datetime.now().isoformat()
+    with _write_transaction() as conn:
+        if "title" in updates:
+            cursor = conn.execute("UPDATE chats SET title = ?, updated_at = ? WHERE id = ?",
+                                  (updates["title"], now, chat_id))
+        else:
+            cursor = conn.execute("UPDATE chats SET updated_at = ? WHERE id = ?", (now, chat_id))
+    if cursor.rowcount == 0:
+        return None
+    with _chats_lock:
+        _dirty_chats.pop(chat_id, None)
+        chat = _chats_by_id.get(chat_id) if _chats_by_id is not None else None
+        if chat:
+            if "title" in updates:
+                chat["title"] = updates["title"]
+            chat["updated_at"] = now
+            _move_to_front(chat)
+    return get_chat_by_id(chat_id)
+
+
+def delete_chat(chat_id: str) -> bool:
+    """Deletes a chat. Returns True if it existed."""
+    with _write_transaction() as conn:
+        cursor = conn.execute("DELETE FROM chats WHERE id = ?", (chat_id,))
+    with _chats_lock:
+        _dirty_chats.pop(chat_id, None)
+        chat = _chats_by_id.pop(chat_id, None) if _chats_by_id is not None else None
+        if chat:
+            _chats_by_user[chat["user_id"]] = [c for c in _chats_by_user.get(chat["user_id"], []) if c["id"] != chat_id]
+    return cursor.rowcount > 0
+
+
+def touch_chat(chat_id: str):
+    """
+    Bumps a chat's updated_at timestamp.
+
+    The new timestamp is visible to readers in this process at once, but is written
+    to the database in a batch at most TOUCH_FLUSH_DELAY seconds later.
+    """
+    global _flush_timer
+    now = datetime.now().isoformat()
+    with _chats_lock:
+        _load_chat_index()
+        chat = _chats_by_id.get(chat_id)
+        if not chat:
+            return
+        chat["updated_at"] = now
+        _move_to_front(chat)
+        _dirty_chats[chat_id] = now
+        if _flush_timer is None:
+            _flush_timer = threading.Timer(TOUCH_FLUSH_DELAY, flush_chat_touches)
+            _flush_timer.daemon = True
+            _flush_timer.start()
+
+
+def flush_chat_touches():
+    """Writes all pending updated_at bumps to the database in one transaction."""
+    global _flush_timer
+    with _chats_lock:
+        _flush_timer = None
+        if not _dirty_chats:
+            return
+        # Keep holding _chats_lock so a concurrent index reload cannot miss these values
+        with _write_transaction() as conn:
+            # Only move updated_at forward, so a stale touch cannot undo a newer write from another process
+            conn.executemany("UPDATE chats SET updated_at = ? WHERE id = ? AND (updated_at IS NULL OR updated_at < ?)",
+                             [(updated_at, chat_id, updated_at) for chat_id, updated_at in _dirty_chats.items()])
+        _dirty_chats.clear()
+
+
+atexit.register(flush_chat_touches)
+
+
+# --- Webhook Tasks ---
+
+@contextmanager
+def _tasks_transaction():
+    """Runs the enclosed statements in one transaction on the webhook task database."""
+    global _tasks_conn
+    with _tasks_lock:
+        if _tasks_conn is None:
+            os.makedirs(DATA_DIR, exist_ok=True)
+            _tasks_conn = sqlite3.connect(TASKS_DB_FILE, check_same_thread=False)
+            _tasks_conn.row_factory = sqlite3.Row
+            _tasks_conn.execute("PRAGMA journal_mode=WAL")
+            _tasks_conn.execute("PRAGMA synchronous=NORMAL")
+            _tasks_conn.executescript(TASKS_SCHEMA)
+        with _tasks_conn:
+            yield _tasks_conn
+
+
+def create_webhook_task(task_id: str, user_id: str):
+    """Records a pending webhook call and prunes replies that were never collected."""
+    now = datetime.now()
+    with _tasks_transaction() as conn:
+        conn.execute("DELETE FROM webhook_tasks WHERE created_at < ?", ((now - TASK_RETENTION).isoformat(),))
+        conn.execute("INSERT INTO webhook_tasks (id, user_id, created_at) VALUES (?, ?, ?)",
+                     (task_id, user_id, now.isoformat()))
+
+
+def complete_webhook_task(task_id: str, response: Dict[str, Any], status_code: int):
+    """Stores the JSON body and HTTP status to return for a finished webhook call."""
+    body = orjson.dumps(response).decode() if orjson else json.dumps(response)
+    with _tasks_transaction() as conn:
+        conn.execute("UPDATE webhook_tasks SET status_code = ?, response = ? WHERE id = ?",
+                     (status_code, body, task_id))
+
+
+def get_webhook_task(task_id: str) -> Optional[Dict[str, Any]]:
+    """
+    Gets a webhook task by its ID.
+
+    Returns:
+        dict: The task with id, user_id, status_code and the decoded response
+              (status_code and response are None while the call is still running),
+              or None if no task has that ID
+    """
+    with _tasks_transaction() as conn:
+        row = conn.execute("SELECT * FROM webhook_tasks WHERE id = ?", (task_id,)).fetchone()
+    if not row:
+        return None
+    task = dict(row)
+    if task["response"] is not None:
+        task["response"] = orjson.loads(task["response"]) if orjson else json.loads(task["response"])
+    return task
+
+
+def delete_webhook_task(task_id: str):
+    """Deletes a webhook task once its reply has been delivered."""
+    with _tasks_transaction() as conn:
+        conn.execute("DELETE FROM webhook_tasks WHERE id = ?", (task_id,))